@@ -1,4 +1,4 @@
-import yaml
+from yaml_loader import load_yaml
 
 
 class Config(object):
@@ -7,9 +7,7 @@ class Config(object):
         self.config = self.load_config()
 
     def load_config(self):
-        with open(self.config_file) as f:
-            config = yaml.load(f, Loader=yaml.FullLoader)
-        return config
+        return load_yaml(self.config_file)
 
 
 global_config = Config().config
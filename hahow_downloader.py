@@ -6,23 +6,37 @@ from tqdm import tqdm
 from concurrent.futures import ThreadPoolExecutor
 
 BASE_URL = "https://api.hahow.in/api"
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+NO_BACKUP_PARAMS = {"requestBackup": "false"}
+USER_AGENT = "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36"
+
+COURSE_URL_PATTERN = re.compile(r"https:\/\/hahow.in\/courses\/([^/]+)")
+INVALID_TITLE_CHARS = re.compile(r"[\\/:*?<>|]")
+VTT_HEADER_PATTERN = re.compile(r"(WEBVTT\s+)(\d{2}:)", re.MULTILINE)
+VTT_TIMESTAMP_PATTERN = re.compile(
+    r"((\d{2}:)?\d{2}:\d{2})\.(\d{3}\s+)-->\s+((\d{2}:)?\d{2}:\d{2})\.(\d{3}\s*)",
+    re.MULTILINE,
+)
 
 class VideoDownloader:
     def __init__(self):
         self.config = global_config
         self.session = requests.Session()
+        # 影片與字幕走 CDN，另用不帶 authorization 的 session 以重用連線
+        self.download_session = requests.Session()
         self.course_id = self.extract_course_id(self.config["course_url"])
 
     @staticmethod
     def extract_course_id(course_url):
-        match = re.match(r"https:\/\/hahow.in\/courses\/([^/]+)", course_url)
+        match = COURSE_URL_PATTERN.match(course_url)
         if not match:
             raise ValueError("课程URL格式错误,请检查")
         return match.group(1)
 
     def fetch_course_title(self):
         response = self.session.get(
-            url=f"{BASE_URL}/courses/{self.course_id}?requestBackup=false",
+            url=f"{BASE_URL}/courses/{self.course_id}",
+            params=NO_BACKUP_PARAMS,
         )
         response.raise_for_status()
         return response.json().get("title")
@@ -36,7 +50,8 @@ class VideoDownloader:
 
     def fetch_lecture_info(self, lecture_id):
         response = self.session.get(
-            url=f"{BASE_URL}/lectures/{lecture_id}?requestBackup=false"
+            url=f"{BASE_URL}/lectures/{lecture_id}",
+            params=NO_BACKUP_PARAMS,
         )
         response.raise_for_status()
         return response.json()
@@ -61,7 +76,7 @@ class VideoDownloader:
         self.session.headers.update(
             {
                 "authorization": self.config["authorization"],
-                "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36",
+                "User-Agent": USER_AGENT,
             }
         )
 
@@ -85,7 +100,7 @@ class VideoDownloader:
             self.download_file(video_url, video_filename)
 
     def format_lecture_title(self, title):
-        return re.sub(r"[\\/:*?<>|]", "-", title)
+        return INVALID_TITLE_CHARS.sub("-", title)
 
     def select_best_quality_video(self, videos):
         sorted_videos = sorted(videos, key=lambda x: x["size"])
@@ -97,6 +112,8 @@ class VideoDownloader:
             subtitle_url = subtitle.get("link")
             format_lecture_title = self.format_lecture_title(lecture_info.get("title"))
             subtitle_filename = f"{course_path}/{chapter_number}-{format_lecture_title}.{subtitle.get('language')}.vtt"
+            if Path(subtitle_filename.replace(".vtt", ".srt")).exists():
+                continue
             self.download_file(subtitle_url, subtitle_filename)
             self.process_lecture_subtitle(subtitle_filename, course_path)
 
@@ -110,26 +127,36 @@ class VideoDownloader:
         Path(vtt_subtitle_path).unlink()
 
     def download_file(self, url, path):
-        response = requests.head(url)
+        response = self.download_session.head(url, allow_redirects=True, timeout=30)
         file_size = int(response.headers.get("content-length", 0))
 
-        with requests.get(url, stream=True) as r:
+        # 已完整下載的文件直接跳過；未完成的文件在伺服器支援時從斷點續傳
+        local_path = Path(path)
+        local_size = local_path.stat().st_size if local_path.exists() else 0
+        if file_size and local_size == file_size:
+            return
+        headers = {}
+        if 0 < local_size < file_size and response.headers.get("accept-ranges") == "bytes":
+            headers["Range"] = f"bytes={local_size}-"
+
+        with self.download_session.get(url, headers=headers, stream=True, timeout=30) as r:
             r.raise_for_status()
-            progress = tqdm(total=file_size, unit="iB", unit_scale=True)
-            with open(path, "wb") as f:
-                for chunk in r.iter_content(chunk_size=8192):
+            resumed = r.status_code == 206
+            progress = tqdm(
+                total=file_size,
+                initial=local_size if resumed else 0,
+                unit="iB",
+                unit_scale=True,
+            )
+            with open(path, "ab" if resumed else "wb") as f:
+                for chunk in r.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
                     progress.update(len(chunk))
                     f.write(chunk)
             progress.close()
 
     def vtt2srt(self, source):
-        vtt_removal = re.compile(r"(WEBVTT\s+)(\d{2}:)", re.MULTILINE)
-        item_matcher = re.compile(
-            r"((\d{2}:)?\d{2}:\d{2})\.(\d{3}\s+)-->\s+((\d{2}:)?\d{2}:\d{2})\.(\d{3}\s*)",
-            re.MULTILINE,
-        )
         separator = "\n"
-        srt_string = re.sub(vtt_removal, r"\2", source)
+        srt_string = VTT_HEADER_PATTERN.sub(r"\2", source)
         line_counter = [0]
 
         def replacer(match):
@@ -141,5 +168,5 @@ class VideoDownloader:
                 p4 = "00:" + p4
             return f"{line_counter[0]}{separator}{p1},{p3} --> {p4},{p6}"
 
-        srt_string = re.sub(item_matcher, replacer, srt_string)
+        srt_string = VTT_TIMESTAMP_PATTERN.sub(replacer, srt_string)
         return srt_string
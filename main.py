@@ -1,12 +1,12 @@
-from sat_downloader import downloader as sat_downloader
-from hahow_downloader import VideoDownloader as hahow_downloader
 from config import global_config
 if __name__ == "__main__":
-    # 下載 hahow 的影片
+    # 下載 hahow 的影片（只在有設定時才載入對應模組）
     if global_config.get("course_url"):
+        from hahow_downloader import VideoDownloader as hahow_downloader
         downloader = hahow_downloader()
         downloader.download_course_videos()
         
     # 下載 sat 的影片
     if global_config["course"]["course_num"]:
+        from sat_downloader import downloader as sat_downloader
         sat_downloader()
\ No newline at end of file
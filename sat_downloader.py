@@ -1,11 +1,36 @@
 import requests
-import yaml
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import gzip
 import json
 import os
-from typing import Dict, List, Optional
-from dataclasses import dataclass
+import re
+import shutil
+import time
+from sys import intern
+from typing import Dict, Iterator, List, Optional
+from dataclasses import MISSING, dataclass, fields
+from functools import lru_cache
 from pathlib import Path
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from yaml_loader import load_yaml
+
+try:
+    import orjson
+except ImportError:  # orjson 為選用依賴，未安裝時使用標準庫 json
+    orjson = None
+
+try:
+    import httpx
+except ImportError:  # httpx 為選用依賴，只在設定 http2: true 時使用
+    httpx = None
+
+def _loads_json(content: bytes):
+    """解析 JSON 位元組，有安裝 orjson 時使用 orjson"""
+    if orjson is not None:
+        return orjson.loads(content)
+    return json.loads(content)
 
 # 設置日誌
 logging.basicConfig(
@@ -14,9 +39,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Config:
-    """配置類別，用於存儲所有設定參數"""
+    """配置類別，用於存儲所有設定參數（唯讀，讀取後不再修改）"""
     course_num: int
     auth_token: str
     fetch_course_content_json: bool
@@ -25,22 +50,43 @@ class Config:
     existed_json_name: str
     desired_quality: str
     base_path: str
+    keep_all_qualities: bool = False
+    fetch_concurrency: int = 8
+    force_refresh: bool = False
+    http2: bool = False
+    compress_json: bool = False
+    download_workers: int = 4
 
     @classmethod
     def from_yaml(cls, yaml_path: str) -> 'Config':
-        """從YAML檔案讀取配置"""
-        with open(yaml_path, 'r', encoding='utf-8') as file:
-            config_data = yaml.safe_load(file)
-            return cls(
-                course_num=config_data['course']['course_num'],
-                auth_token=config_data['auth']['token'],
-                fetch_course_content_json=config_data['fetch_course_content_json'],
-                download_from_fetch_dict=config_data['download_from_fetch_dict'],
-                download_from_existed_json=config_data['download_from_existed_json'],
-                existed_json_name=config_data['existed_json_name'],
-                desired_quality=config_data['desired_quality'],
-                base_path=config_data['base_path']
-            )
+        """從YAML檔案讀取配置（共用 yaml_loader.load_yaml 的快取，不重複解析）
+
+        course.course_num 與 auth.token 位於巢狀區塊，其餘欄位對應 YAML 頂層的同名鍵；
+        有預設值的欄位可以省略，新增欄位時只需在類別中宣告
+        """
+        config_data = load_yaml(yaml_path)
+        values = {
+            'course_num': config_data['course']['course_num'],
+            'auth_token': config_data['auth']['token'],
+        }
+        for config_field in fields(cls):
+            if config_field.name in values:
+                continue
+            if config_field.name in config_data:
+                values[config_field.name] = config_data[config_field.name]
+            elif config_field.default is MISSING:
+                raise KeyError(f"配置缺少必要欄位: {config_field.name}")
+        return cls(**values)
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+# 與 token 無關的固定請求頭
+BROWSER_HEADERS = {
+    'accept': 'application/json, text/plain, */*',
+    'origin': 'https://sat.cool',
+    'referer': 'https://sat.cool/',
+    'user-agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36'
+}
 
 class SATCourseClient:
     """SAT課程API客戶端"""
@@ -49,33 +95,83 @@ class SATCourseClient:
         self.api_base_url = f'https://api.sat.cool/api/v2/classroom/{config.course_num}'
         self.vimeo_api_url = f'{self.api_base_url}/vimeo'
         self.headers = self._init_headers()
+        # 共用同一個 Session，讓 API 請求重用 TCP/TLS 連線
+        self.session = self._init_session()
+        self._course_data: Optional[Dict] = None
     
     def _init_headers(self) -> Dict:
         """初始化請求頭"""
-        return {
-            'authorization': self.config.auth_token,
-            'accept': 'application/json, text/plain, */*',
-            'origin': 'https://sat.cool',
-            'referer': 'https://sat.cool/',
-            'user-agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/133.0.0.0 Safari/537.36'
-        }
+        return {'authorization': self.config.auth_token, **BROWSER_HEADERS}
+    
+    def _init_session(self):
+        """建立 API 請求用的 Session
+
+        啟用 http2 且已安裝 httpx[http2] 時，所有影片資源請求在同一條 TLS
+        連線上多工傳輸；否則使用帶重試機制的 requests.Session（HTTP/1.1）
+        """
+        if self.config.http2:
+            if httpx is None:
+                logger.warning("未安裝 httpx，改用 HTTP/1.1")
+            else:
+                try:
+                    return httpx.Client(
+                        http2=True,
+                        headers=self.headers,
+                        limits=httpx.Limits(max_connections=4, max_keepalive_connections=4),
+                        timeout=30.0
+                    )
+                except ImportError:
+                    logger.warning("未安裝 h2（pip install 'httpx[http2]'），改用 HTTP/1.1")
+        
+        session = requests.Session()
+        session.headers.update(self.headers)
+        session.mount('https://', HTTPAdapter(
+            max_retries=self._init_retry(),
+            pool_maxsize=self.config.fetch_concurrency
+        ))
+        return session
+    
+    @staticmethod
+    def _init_retry() -> Retry:
+        """429/5xx 時以指數退避重試，並遵守伺服器的 Retry-After"""
+        return Retry(
+            total=5,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+    
+    def close(self):
+        """關閉連線池"""
+        self.session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
     
     def get_course_data(self) -> Dict:
-        """獲取課程完整數據"""
-        logger.info(f"正在獲取課程 {self.config.course_num} 的數據...")
-        response = requests.get(self.api_base_url, headers=self.headers)
+        """獲取課程完整數據，同一次執行中只請求一次"""
+        if self._course_data is not None:
+            return self._course_data
+        
+        logger.info("正在獲取課程 %s 的數據...", self.config.course_num)
+        response = self.session.get(self.api_base_url, timeout=15)
         
         if response.status_code != 200:
-            logger.error(f"獲取課程數據失敗: {response.status_code} - {response.text}")
+            logger.error("獲取課程數據失敗: %s - %s", response.status_code, response.text)
             raise Exception(f"獲取課程數據失敗: {response.status_code}")
         
-        data = response.json()
+        data = _loads_json(response.content)
         if not data.get('success'):
-            logger.error(f"API返回錯誤: {data.get('message', '未知錯誤')}")
+            logger.error("API返回錯誤: %s", data.get('message', '未知錯誤'))
             raise Exception(f"API返回錯誤: {data.get('message', '未知錯誤')}")
         
-        logger.info(f"成功獲取課程數據")
-        return data['data']
+        logger.info("成功獲取課程數據")
+        self._course_data = data['data']
+        return self._course_data
     
     def get_video_data(self, part_id: str) -> Dict:
         """獲取影片詳細數據
@@ -86,27 +182,73 @@ class SATCourseClient:
         Returns:
             影片詳細數據
         """
-        logger.info(f"正在獲取影片 {part_id} 的數據...")
-        url = f"{self.vimeo_api_url}?course_chapter_part_id={part_id}"
-        
-        response = requests.get(url, headers=self.headers)
+        logger.info("正在獲取影片 %s 的數據...", part_id)
+        response = self.session.get(
+            self.vimeo_api_url,
+            params={'course_chapter_part_id': part_id},
+            timeout=15
+        )
         
         if response.status_code != 200:
-            logger.error(f"獲取影片數據失敗: {response.status_code} - {response.text}")
+            logger.error("獲取影片數據失敗: %s - %s", response.status_code, response.text)
             raise Exception(f"獲取影片數據失敗: {response.status_code}")
         
-        data = response.json()
+        data = _loads_json(response.content)
         if not data.get('success'):
-            logger.error(f"API返回錯誤: {data.get('message', '未知錯誤')}")
+            logger.error("API返回錯誤: %s", data.get('message', '未知錯誤'))
             raise Exception(f"API返回錯誤: {data.get('message', '未知錯誤')}")
         
-        logger.info(f"成功獲取影片 {part_id} 的數據")
+        logger.info("成功獲取影片 %s 的數據", part_id)
         return data['data']
 
+@dataclass
+class PartRef:
+    """課程部分在課程結構中的位置與內容"""
+    chapter_idx: int
+    chapter_name: str
+    part_idx: int
+    part_id: Optional[str]
+    part_name: str
+    part: Dict
+
 class CourseParser:
     """課程內容解析器"""
     
     @staticmethod
+    def flatten_parts(course_info: Dict) -> List[PartRef]:
+        """將 API 返回的章節/部分結構攤平成依序排列的部分列表
+        
+        Args:
+            course_info: get_course_data 返回的課程數據
+            
+        Returns:
+            所有課程部分，章節與部分的編號皆從 1 開始
+        """
+        parts = []
+        for chapter_idx, chapter in enumerate(course_info.get('chapters', []), 1):
+            chapter_name = chapter.get('name', 'Unknown Chapter')
+            for part_idx, part in enumerate(chapter.get('course_chapter_parts', []), 1):
+                parts.append(PartRef(
+                    chapter_idx=chapter_idx,
+                    chapter_name=chapter_name,
+                    part_idx=part_idx,
+                    part_id=part.get('id'),
+                    part_name=part.get('name', f"Part_{len(parts) + 1}"),
+                    part=part
+                ))
+        return parts
+    
+    @staticmethod
+    def extract_course_name(data: Dict) -> str:
+        """從課程數據中獲取課程名稱，兼容舊版含 course_info 的結構"""
+        return (
+            data.get('course_name')
+            or (data.get('course_info') or {}).get('course', {}).get('name')
+            or 'unknown_course'
+        )
+    
+    @staticmethod
+    @lru_cache(maxsize=1024)
     def format_duration(seconds: int) -> str:
         """將秒數格式化為分鐘和秒"""
         if not seconds:
@@ -125,49 +267,62 @@ class CourseParser:
         Returns:
             格式化後的課程結構文本
         """
+        return "".join(CourseParser.iter_course_structure_lines(course_data))
+    
+    @staticmethod
+    def iter_course_structure_lines(course_data: Dict) -> Iterator[str]:
+        """逐行產生課程結構文本，每行皆以換行結尾
+        
+        Args:
+            course_data: 課程數據
+            
+        Yields:
+            課程結構文本的每一行
+        """
         course_name = course_data.get('course_name', '未知課程')
         chapters = course_data.get('chapters', [])
+        format_duration = CourseParser.format_duration
         
-        lines = []
-        lines.append(f"課程名稱: {course_name}")
-        lines.append("")
+        yield f"課程名稱: {course_name}\n"
+        yield "\n"
         
         total_duration = 0
         for chapter in chapters:
             chapter_title = chapter.get('chapter_title', '')
-            chapter_duration = chapter.get('chapter_duration', 0)
             sub_chapters = chapter.get('sub_chapters', [])
             
             # 計算章節總時長
             chapter_total_duration = sum(sub.get('duration', 0) for sub in sub_chapters if 'error' not in sub)
             total_duration += chapter_total_duration
             
-            lines.append(f"{chapter_title} (總時長: {CourseParser.format_duration(chapter_total_duration)})")
+            yield f"{chapter_title} (總時長: {format_duration(chapter_total_duration)})\n"
             
             for sub_chapter in sub_chapters:
                 title = sub_chapter.get('title', '')
                 duration = sub_chapter.get('duration', 0)
                 
                 if 'error' in sub_chapter:
-                    lines.append(f"  {title} (獲取資訊失敗)")
+                    yield f"  {title} (獲取資訊失敗)\n"
                 else:
-                    lines.append(f"  {title} (時長: {CourseParser.format_duration(duration)})")
+                    yield f"  {title} (時長: {format_duration(duration)})\n"
                 
                 # 列出課程材料
                 materials = sub_chapter.get('materials', [])
                 if materials:
-                    lines.append(f"  課程材料:")
+                    yield "  課程材料:\n"
                     for material in materials:
-                        lines.append(f"    - {material.get('name')}: {material.get('url')}")
+                        yield f"    - {material.get('name')}: {material.get('url')}\n"
             
-            lines.append("")
+            yield "\n"
         
-        lines.append(f"課程總時長: {CourseParser.format_duration(total_duration)}")
-        return "\n".join(lines)
+        yield f"課程總時長: {format_duration(total_duration)}\n"
 
 class CourseDataCollector:
     """課程資料收集器，負責獲取和處理課程資訊"""
     
+    # Vimeo 影片連結帶有會過期的簽名，快取只在這段時間內有效（秒）
+    VIDEO_CACHE_TTL = 6 * 60 * 60
+    
     def __init__(self, config: Config, client: SATCourseClient):
         self.config = config
         self.client = client
@@ -192,9 +347,8 @@ class CourseDataCollector:
         if not json_path.exists():
             raise FileNotFoundError(f"找不到指定的 JSON 檔案：{json_path}")
         
-        logger.info(f"從已存在的 JSON 檔案讀取課程資料：{json_path}")
-        with open(json_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        logger.info("從已存在的 JSON 檔案讀取課程資料：%s", json_path)
+        return FileUtils.load_json(json_path)
     
     def _enrich_with_video_resources(self, course_data: Dict) -> Dict:
         """豐富課程資料，添加影片資源資訊"""
@@ -207,118 +361,147 @@ class CourseDataCollector:
         }
         
         chapters = course_data.get('chapters', [])
-        total_videos = sum(len(chapter.get('course_chapter_parts', [])) for chapter in chapters)
-        processed_count = 0
-        
         for chapter in chapters:
-            chapter_data = {
+            enriched_data['chapters'].append({
                 'chapter_title': chapter.get('name', 'Unknown Chapter'),
                 'chapter_duration': chapter.get('duration', 0),  # 添加章節時長
                 'sub_chapters': []
-            }
-            
-            for part in chapter.get('course_chapter_parts', []):
-                processed_count += 1
-                part_id = part.get('id')
-                part_name = part.get('name', f"Part_{processed_count}")
-                
-                if not part_id:
-                    logger.warning(f"部分 {part_name} 沒有ID，跳過")
+            })
+        
+        parts = CourseParser.flatten_parts(course_data)
+        total_videos = len(parts)
+        
+        # 只保留需要的畫質連結，除非設定保留全部畫質
+        kept_quality = None if self.config.keep_all_qualities else self.config.desired_quality
+        
+        with ThreadPoolExecutor(max_workers=self.config.fetch_concurrency) as executor:
+            # 先提交所有影片資源請求，再依原本的章節順序收集結果
+            part_futures = []
+            for index, part_ref in enumerate(parts, 1):
+                if not part_ref.part_id:
+                    logger.warning("部分 %s 沒有ID，跳過", part_ref.part_name)
                     continue
                 
-                logger.info(f"獲取影片資源 ({processed_count}/{total_videos}): {part_name}")
-                
-                try:
-                    video_data = self.client.get_video_data(part_id)
-                    
-                    # 整理影片連結
-                    video_links = {}
-                    for file_info in video_data.get('files', []):
-                        rendition = file_info.get('rendition')
-                        link = file_info.get('link')
-                        if rendition and link:
-                            video_links[rendition] = link
-                    
-                    # 整理字幕連結
-                    subtitle_links = {}
-                    for subtitle in video_data.get('texttracks', []):
-                        if subtitle.get('type') == 'subtitles':
-                            lang = subtitle.get('language', 'unknown')
-                            link = subtitle.get('link')
-                            if link:
-                                subtitle_links[lang] = link
-                    
-                    # 建立子章節資料
-                    sub_chapter = {
-                        'title': part_name,
-                        'duration': part.get('duration', 0),  # 添加部分時長
-                        'video_links': video_links,
-                        'subtitle_links': subtitle_links
-                    }
-                    
-                    # 添加課程材料
-                    materials = part.get('materials', [])
-                    if materials:
-                        sub_chapter['materials'] = [
-                            {
-                                'name': material.get('name'),
-                                'url': material.get('file_url')
-                            }
-                            for material in materials
-                        ]
-                    
-                    chapter_data['sub_chapters'].append(sub_chapter)
-                    
-                except Exception as e:
-                    logger.error(f"獲取影片 {part_name} 資源資訊時出錯: {str(e)}")
-                    chapter_data['sub_chapters'].append({
-                        'title': part_name,
-                        'error': str(e)
-                    })
+                future = executor.submit(
+                    self._fetch_video_data, part_ref.part_id, part_ref.part_name, index, total_videos
+                )
+                part_futures.append((part_ref, future))
             
-            enriched_data['chapters'].append(chapter_data)
+            try:
+                for part_ref, future in part_futures:
+                    sub_chapters = enriched_data['chapters'][part_ref.chapter_idx - 1]['sub_chapters']
+                    try:
+                        sub_chapters.append(
+                            self._build_sub_chapter(part_ref.part, part_ref.part_name, future.result(), kept_quality)
+                        )
+                    except Exception as e:
+                        logger.error("獲取影片 %s 資源資訊時出錯: %s", part_ref.part_name, e)
+                        sub_chapters.append({
+                            'title': part_ref.part_name,
+                            'error': str(e)
+                        })
+            except KeyboardInterrupt:
+                # 取消尚未開始的請求，避免離開 with 區塊時等整個佇列跑完
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
         
         return enriched_data
     
+    @staticmethod
+    def _build_sub_chapter(part: Dict, part_name: str, video_data: Dict, kept_quality: Optional[str] = None) -> Dict:
+        """由課程部分與影片資源資訊建立子章節資料
+
+        畫質與語言代碼在每個部分都會重複出現，以 intern 共用同一字串物件。
+        指定 kept_quality 且該畫質存在時，只保留該畫質的連結；
+        不存在時保留全部，讓下載階段仍可退回 adaptive 或中間畫質。
+        """
+        video_links = {
+            intern(file_info['rendition']): file_info['link']
+            for file_info in video_data.get('files', [])
+            if file_info.get('rendition') and file_info.get('link')
+        }
+        if kept_quality in video_links:
+            video_links = {kept_quality: video_links[kept_quality]}
+        
+        sub_chapter = {
+            'title': part_name,
+            'duration': part.get('duration', 0),  # 添加部分時長
+            'video_links': video_links,
+            'subtitle_links': {
+                intern(subtitle.get('language') or 'unknown'): subtitle['link']
+                for subtitle in video_data.get('texttracks', [])
+                if subtitle.get('type') == 'subtitles' and subtitle.get('link')
+            }
+        }
+        
+        # 添加課程材料
+        materials = part.get('materials', [])
+        if materials:
+            sub_chapter['materials'] = [
+                {'name': material.get('name'), 'url': material.get('file_url')}
+                for material in materials
+            ]
+        
+        return sub_chapter
+    
+    def _fetch_video_data(self, part_id: str, part_name: str, index: int, total: int) -> Dict:
+        """獲取單個影片的資源資訊（於執行緒池中執行），優先使用未過期的本地快取"""
+        cache_path = self._video_cache_path(part_id)
+        if not self.config.force_refresh and self._is_cache_fresh(cache_path):
+            try:
+                video_data = FileUtils.load_json(cache_path)
+                logger.info("使用快取的影片資源 (%d/%d): %s", index, total, part_name)
+                return video_data
+            except (OSError, ValueError) as e:
+                logger.warning("影片資源快取損毀，重新獲取 %s: %s", part_name, e)
+        
+        logger.info("獲取影片資源 (%d/%d): %s", index, total, part_name)
+        video_data = self.client.get_video_data(part_id)
+        
+        cache_path.parent.mkdir(exist_ok=True, parents=True)
+        FileUtils.dump_json(video_data, cache_path)
+        return video_data
+    
+    def _video_cache_path(self, part_id: str) -> Path:
+        """影片資源快取的路徑"""
+        return self.base_path / f"course_{self.config.course_num}" / "_cache" / f"{part_id}.json"
+    
+    def _is_cache_fresh(self, cache_path: Path) -> bool:
+        """快取是否存在且未超過有效期限"""
+        try:
+            return time.time() - cache_path.stat().st_mtime < self.VIDEO_CACHE_TTL
+        except FileNotFoundError:
+            return False
+    
     def _save_json(self, data: Dict):
         """保存數據到JSON文件"""
-        course_name = self._get_course_name(data)
-        course_name = FileUtils.sanitize_filename(course_name)
+        course_name = FileUtils.sanitize_filename(CourseParser.extract_course_name(data))
         
         output_dir = self.base_path / f"course_{self.config.course_num}"
         output_dir.mkdir(exist_ok=True, parents=True)
         
-        json_path = output_dir / f"{course_name}_resources.json"
-        with open(json_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        suffix = '.json.gz' if self.config.compress_json else '.json'
+        json_path = output_dir / f"{course_name}_resources{suffix}"
+        FileUtils.dump_json(data, json_path, compress=self.config.compress_json)
         
-        logger.info(f"課程數據已保存到: {json_path}")
+        logger.info("課程數據已保存到: %s", json_path)
         self._create_course_structure(data, output_dir)
     
     def _create_course_structure(self, data: Dict, output_dir: Path):
         """創建課程結構文件"""
-        structure_text = CourseParser.format_course_structure(data)
         structure_path = output_dir / "course_structure.txt"
         
         with open(structure_path, 'w', encoding='utf-8') as f:
-            f.write(structure_text)
+            f.writelines(CourseParser.iter_course_structure_lines(data))
         
-        logger.info(f"課程結構已保存到: {structure_path}")
-    
-    def _get_course_name(self, data: Dict) -> str:
-        """從數據中獲取課程名稱"""
-        # 直接從新的數據結構中獲取課程名稱
-        course_name = data.get('course_name', '')
-        if course_name:
-            return course_name
-            
-        # 如果找不到，嘗試從舊的數據結構中獲取（向後兼容）
-        if 'course_info' in data:
-            course_info = data['course_info']
-            if 'course' in course_info and 'name' in course_info['course']:
-                return course_info['course']['name']
-                
-        return "unknown_course"
+        logger.info("課程結構已保存到: %s", structure_path)
+
+@dataclass
+class DownloadJob:
+    """單個文件的下載任務"""
+    kind: str
+    url: str
+    path: Path
 
 class CourseContentDownloader:
     """課程內容下載器，負責下載影片和字幕"""
@@ -326,72 +509,94 @@ class CourseContentDownloader:
     def __init__(self, config: Config):
         self.config = config
         self.base_path = Path(config.base_path)
+        self._quality_order = (config.desired_quality, 'adaptive')
+        # 目錄 -> 其中的文件名稱，每次下載時每個目錄只列舉一次
+        self._dir_listing: Dict[Path, set] = {}
+        # 影片、字幕與材料來自 CDN，使用獨立的 Session 以重用連線
+        self.session = requests.Session()
+        self.session.mount('https://', HTTPAdapter(
+            pool_maxsize=config.download_workers * 2,
+            max_retries=Retry(total=3, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504])
+        ))
+    
+    def close(self):
+        """關閉連線池"""
+        self.session.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
     
-    def download(self, course_data: Dict):
+    def download(self, course_data: Dict, course_name: Optional[str] = None):
         """下載課程內容"""
         if not course_data:
             logger.error("無課程數據可下載")
             return
         
-        course_name = course_data.get('course_name', 'unknown_course')
+        if course_name is None:
+            course_name = CourseParser.extract_course_name(course_data)
         chapters = course_data.get('chapters', [])
         
-        logger.info(f"開始下載課程: {course_name}")
+        logger.info("開始下載課程: %s", course_name)
         course_dir = self._prepare_course_directory()
+        self._dir_listing.clear()
         
+        # 先收集所有下載任務，再交由執行緒池並行下載
+        jobs: List[DownloadJob] = []
         for chapter_idx, chapter in enumerate(chapters, 1):
-            self._process_chapter(chapter, chapter_idx, course_dir)
+            self._process_chapter(chapter, chapter_idx, course_dir, jobs)
         
-        logger.info(f"課程 {course_name} 下載完成")
+        self._run_jobs(jobs)
+        logger.info("課程 %s 下載完成", course_name)
     
-    def _process_chapter(self, chapter: Dict, chapter_idx: int, course_dir: Path):
-        """處理單個章節的下載"""
+    def _process_chapter(self, chapter: Dict, chapter_idx: int, course_dir: Path, jobs: List[DownloadJob]):
+        """處理單個章節，收集其下載任務"""
         chapter_title = chapter.get('chapter_title', f"Chapter_{chapter_idx}")
-        chapter_dir = self._create_chapter_directory(course_dir, chapter_idx, chapter_title)
+        chapter_dir = self._chapter_directory(course_dir, chapter_idx, chapter_title)
         
-        logger.info(f"處理章節 {chapter_idx}: {chapter_title}")
+        logger.info("處理章節 %d: %s", chapter_idx, chapter_title)
         
         for part_idx, part in enumerate(chapter.get('sub_chapters', []), 1):
-            self._process_sub_chapter(part, part_idx, chapter_dir)
+            self._process_sub_chapter(part, part_idx, chapter_dir, jobs)
     
-    def _process_sub_chapter(self, part: Dict, part_idx: int, chapter_dir: Path):
-        """處理子章節的下載"""
+    def _process_sub_chapter(self, part: Dict, part_idx: int, chapter_dir: Path, jobs: List[DownloadJob]):
+        """處理子章節，收集其下載任務"""
         part_title = part.get('title', f"Part_{part_idx}")
         
         if 'error' in part:
-            logger.error(f"    跳過影片 {part_title}: {part['error']}")
+            logger.error("    跳過影片 %s: %s", part_title, part['error'])
             return
         
-        # 下載影片
+        # 影片
         video_links = part.get('video_links', {})
         if video_links:
             video_url = self._get_video_url(video_links)
             if video_url:
-                self._download_video(video_url, part_idx, part_title, chapter_dir)
+                self._queue_video(video_url, part_idx, part_title, chapter_dir, jobs)
         
-        # 下載字幕
+        # 字幕
         subtitle_links = part.get('subtitle_links', {})
         if subtitle_links:
-            self._download_subtitles(subtitle_links, part_idx, part_title, chapter_dir)
+            self._queue_subtitles(subtitle_links, part_idx, part_title, chapter_dir, jobs)
         
-        # 下載課程材料
+        # 課程材料
         materials = part.get('materials', [])
         if materials:
-            self._download_materials(materials, part_idx, part_title, chapter_dir)
+            self._queue_materials(materials, part_idx, part_title, chapter_dir, jobs)
     
     def _get_video_url(self, video_links: Dict) -> Optional[str]:
         """獲取最適合的影片URL"""
         if not video_links:
             return None
         
-        # 優先使用指定畫質
-        if self.config.desired_quality in video_links:
-            return video_links[self.config.desired_quality]
-        
-        # 其次使用自適應畫質
-        if 'adaptive' in video_links:
-            logger.info("    使用 adaptive 畫質")
-            return video_links['adaptive']
+        # 優先使用指定畫質，其次使用自適應畫質
+        for quality in self._quality_order:
+            if quality in video_links:
+                if quality == 'adaptive':
+                    logger.info("    使用 adaptive 畫質")
+                return video_links[quality]
         
         # 最後選擇中間畫質
         return self._select_middle_quality(video_links)
@@ -402,42 +607,48 @@ class CourseContentDownloader:
         if not qualities:
             return None
         
-        try:
-            qualities.sort(key=lambda x: int(x.replace('p', '')))
-            mid_quality = qualities[len(qualities) // 2]
-            logger.info(f"    使用中間畫質: {mid_quality}")
+        mid_quality = self._middle_quality_of(frozenset(qualities))
+        if mid_quality is not None:
+            logger.info("    使用中間畫質: %s", mid_quality)
             return video_links[mid_quality]
+        
+        quality = qualities[0]
+        logger.warning("    無法解析畫質數值，使用畫質: %s", quality)
+        return video_links[quality]
+    
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def _middle_quality_of(qualities: frozenset) -> Optional[str]:
+        """依數值排序畫質並回傳中間者，無法解析數值時回傳 None
+
+        同一課程各部分的畫質組合通常相同，因此以畫質集合快取結果
+        """
+        try:
+            ordered = sorted(qualities, key=lambda x: int(x.replace('p', '')))
         except (ValueError, TypeError):
-            quality = qualities[0]
-            logger.warning(f"    無法解析畫質數值，使用畫質: {quality}")
-            return video_links[quality]
+            return None
+        return ordered[len(ordered) // 2]
     
-    def _download_video(self, video_url: str, part_idx: int, part_title: str, chapter_dir: Path):
-        """下載影片"""
+    def _queue_video(self, video_url: str, part_idx: int, part_title: str, chapter_dir: Path, jobs: List[DownloadJob]):
+        """加入影片下載任務"""
         video_filename = f"{part_idx:02d}_{FileUtils.sanitize_filename(part_title)}.mp4"
         video_path = chapter_dir / video_filename
         
-        if video_path.exists():
-            logger.info(f"    影片已存在: {video_filename}")
-            return
-        
-        logger.info(f"    下載影片: {video_filename}")
-        self._download_file(video_url, video_path)
+        # 已存在的影片仍交由 _download_file 比對遠端大小，以找出中斷留下的不完整文件
+        jobs.append(DownloadJob('影片', video_url, video_path))
     
-    def _download_subtitles(self, subtitle_links: Dict, part_idx: int, part_title: str, chapter_dir: Path):
-        """下載字幕"""
+    def _queue_subtitles(self, subtitle_links: Dict, part_idx: int, part_title: str, chapter_dir: Path, jobs: List[DownloadJob]):
+        """加入字幕下載任務"""
         for lang, subtitle_url in subtitle_links.items():
             subtitle_filename = f"{part_idx:02d}_{FileUtils.sanitize_filename(part_title)}_{lang}.vtt"
             subtitle_path = chapter_dir / subtitle_filename
             
-            if not subtitle_path.exists():
-                logger.info(f"    下載字幕: {subtitle_filename}")
-                self._download_file(subtitle_url, subtitle_path)
+            if not self._exists(subtitle_path):
+                jobs.append(DownloadJob('字幕', subtitle_url, subtitle_path))
     
-    def _download_materials(self, materials: List[Dict], part_idx: int, part_title: str, chapter_dir: Path):
-        """下載課程材料"""
+    def _queue_materials(self, materials: List[Dict], part_idx: int, part_title: str, chapter_dir: Path, jobs: List[DownloadJob]):
+        """加入課程材料下載任務"""
         materials_dir = chapter_dir / "materials"
-        materials_dir.mkdir(exist_ok=True, parents=True)
         
         for material in materials:
             material_name = material.get('name', 'unknown')
@@ -450,53 +661,208 @@ class CourseContentDownloader:
             material_filename = f"{part_idx:02d}_{FileUtils.sanitize_filename(part_title)}_{FileUtils.sanitize_filename(material_name)}.{ext}"
             material_path = materials_dir / material_filename
             
-            if not material_path.exists():
-                logger.info(f"    下載課程材料: {material_filename}")
-                self._download_file(material_url, material_path)
+            if not self._exists(material_path):
+                jobs.append(DownloadJob('課程材料', material_url, material_path))
+    
+    def _exists(self, path: Path) -> bool:
+        """判斷文件是否存在，每個目錄只以 os.scandir 列舉一次，避免逐一 stat"""
+        names = self._dir_listing.get(path.parent)
+        if names is None:
+            try:
+                with os.scandir(path.parent) as entries:
+                    names = {entry.name for entry in entries}
+            except FileNotFoundError:
+                names = set()
+            self._dir_listing[path.parent] = names
+        return path.name in names
     
-    def _download_file(self, url: str, path: Path) -> bool:
-        """下載文件的通用方法"""
+    def _run_jobs(self, jobs: List[DownloadJob]):
+        """以執行緒池並行執行下載任務"""
+        if not jobs:
+            logger.info("沒有需要下載的文件")
+            return
+        
+        self._create_job_directories(jobs)
+        logger.info("共 %d 個文件待下載，並行數: %d", len(jobs), self.config.download_workers)
+        failed_count = 0
+        with ThreadPoolExecutor(max_workers=self.config.download_workers) as executor:
+            futures = {executor.submit(self._run_job, job): job for job in jobs}
+            try:
+                for done_count, future in enumerate(as_completed(futures), 1):
+                    job = futures[future]
+                    if future.result():
+                        logger.info("    (%d/%d) 完成: %s", done_count, len(jobs), job.path.name)
+                    else:
+                        failed_count += 1
+                        logger.warning("    (%d/%d) 失敗: %s", done_count, len(jobs), job.path.name)
+            except KeyboardInterrupt:
+                # 取消尚未開始的下載，只等正在進行的文件結束，避免離開 with 區塊時等整個佇列跑完
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+        
+        if failed_count:
+            logger.warning("有 %d 個文件下載失敗", failed_count)
+    
+    def _run_job(self, job: DownloadJob) -> bool:
+        """執行單個下載任務"""
+        return self._download_file(job.url, job.path, job.kind)
+    
+    def _download_file(self, url: str, path: Path, kind: str = '文件') -> bool:
+        """下載文件的通用方法
+
+        內容先寫入 .part 暫存檔，完成後才改名為正式文件名。已有正式文件或
+        .part 暫存檔時不另發 HEAD，直接以 Range 從本地大小往後請求並依回應判斷：
+        416 表示正式文件已完整、206 從斷點續傳、200 表示伺服器忽略 Range 而重新下載
+        """
+        part_path = path.with_name(path.name + '.part')
         try:
-            with requests.get(url, stream=True) as response:
+            existing = path if path.exists() else part_path if part_path.exists() else None
+            resume_from = existing.stat().st_size if existing else 0
+            headers = {'Range': f'bytes={resume_from}-'} if resume_from else {}
+            with self.session.get(url, headers=headers, stream=True, timeout=(5, 60)) as response:
+                total_size = self._remote_size(response)
+                
+                if response.status_code == 416:
+                    # 起點已達遠端大小，無法取得遠端大小時同樣視為已下載。
+                    # .part 達到完整大小可能只是預先配置後被強制中斷，內容未必寫完，
+                    # 因此只信任正式文件，.part 一律捨棄重新下載
+                    if existing is path and (not total_size or total_size == resume_from):
+                        logger.info("    %s已存在: %s", kind, path.name)
+                        return True
+                    return self._restart_download(response, existing, url, path, kind)
+                if existing is path and not response.ok:
+                    # 無法向伺服器確認（例如簽名連結已過期）時沿用舊行為，視為已下載
+                    logger.info("    %s已存在: %s", kind, path.name)
+                    return True
                 response.raise_for_status()
-                total_size = int(response.headers.get('content-length', 0))
                 
-                if total_size > 0:
-                    logger.info(f"    文件大小: {total_size / (1024 * 1024):.2f} MB")
+                resumed = response.status_code == 206
+                if resumed and 'content-encoding' in response.headers:
+                    # 壓縮內容的位元組範圍無法直接接在本地文件之後，捨棄後重新下載
+                    return self._restart_download(response, existing, url, path, kind)
+                if existing is path:
+                    # 無法取得遠端大小時沿用舊行為，視為已下載
+                    if not resumed and total_size in (0, resume_from):
+                        logger.info("    %s已存在: %s", kind, path.name)
+                        return True
+                    if resumed:
+                        os.replace(path, part_path)
+                    else:
+                        logger.info("    %s大小不符，重新下載: %s", kind, path.name)
                 
-                with open(path, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        f.write(chunk)
+                if resumed:
+                    logger.info("    續傳%s: %s (%.2f / %.2f MB)", kind, path.name,
+                                resume_from / (1024 * 1024), total_size / (1024 * 1024))
+                else:
+                    logger.info("    下載%s: %s", kind, path.name)
+                    if total_size > 0 and logger.isEnabledFor(logging.INFO):
+                        logger.info("    文件大小: %.2f MB", total_size / (1024 * 1024))
+                
+                # 由 shutil.copyfileobj 在 C 層以 1 MiB 區塊搬移資料；
+                # 每次寫入已是大區塊，因此關閉檔案緩衝避免重複複製
+                response.raw.decode_content = True
+                with open(part_path, 'ab' if resumed else 'wb', buffering=0) as f:
+                    try:
+                        if not resumed and total_size > 0:
+                            self._preallocate(f, total_size)
+                        shutil.copyfileobj(response.raw, f, length=1024 * 1024)
+                    finally:
+                        # 截掉預先配置但未寫入的空間；中斷時保留已下載的部分供下次續傳
+                        f.truncate(f.tell())
             
+            os.replace(part_path, path)
             return True
         except Exception as e:
-            logger.error(f"下載文件時出錯: {str(e)}")
-            if path.exists():
-                path.unlink()
+            logger.error("下載文件時出錯: %s", e)
             return False
     
+    def _restart_download(self, response, existing: Path, url: str, path: Path, kind: str) -> bool:
+        """關閉目前的回應並刪除無法續傳的本地文件，再從頭下載"""
+        response.close()
+        existing.unlink()
+        return self._download_file(url, path, kind)
+    
+    @staticmethod
+    def _remote_size(response) -> int:
+        """從 Content-Range 或 Content-Length 取得遠端文件的完整大小，無法得知時回傳 0"""
+        total = response.headers.get('content-range', '').rpartition('/')[2]
+        if total.isdigit():
+            return int(total)
+        if response.status_code == 200:
+            return int(response.headers.get('content-length', 0))
+        return 0
+    
+    @staticmethod
+    def _preallocate(f, size: int):
+        """預先配置文件空間，讓大型影片盡量連續存放以減少碎片"""
+        try:
+            if hasattr(os, 'posix_fallocate'):
+                os.posix_fallocate(f.fileno(), 0, size)
+            else:
+                f.truncate(size)
+        except OSError:
+            # 部分文件系統（FAT、某些網路磁碟）不支援預先配置，直接略過
+            pass
+    
     def _prepare_course_directory(self) -> Path:
         """準備課程下載目錄"""
         course_dir = self.base_path / f"course_{self.config.course_num}" / "videos"
         course_dir.mkdir(exist_ok=True, parents=True)
         return course_dir
     
-    def _create_chapter_directory(self, course_dir: Path, chapter_idx: int, chapter_title: str) -> Path:
-        """創建章節目錄"""
-        chapter_dir = course_dir / f"{chapter_idx:02d}_{FileUtils.sanitize_filename(chapter_title)}"
-        chapter_dir.mkdir(exist_ok=True, parents=True)
-        return chapter_dir
+    def _chapter_directory(self, course_dir: Path, chapter_idx: int, chapter_title: str) -> Path:
+        """取得章節目錄路徑（實際建立交由 _create_job_directories 統一處理）"""
+        return course_dir / f"{chapter_idx:02d}_{FileUtils.sanitize_filename(chapter_title)}"
+    
+    @staticmethod
+    def _create_job_directories(jobs: List[DownloadJob]):
+        """一次建立所有下載任務需要的目錄，每個目錄只建立一次"""
+        directories = {job.path.parent for job in jobs}
+        for directory in sorted(directories, key=lambda d: len(d.parts)):
+            directory.mkdir(exist_ok=True, parents=True)
 
 class FileUtils:
     """文件操作工具類"""
     
+    # 每個不合法字符各替換為一個底線；不合併連續字符，以免已下載文件的名稱改變
+    _INVALID_CHARS_PATTERN = re.compile(r'[\\/:*?"<>|]')
+    
     @staticmethod
+    @lru_cache(maxsize=1024)
     def sanitize_filename(filename: str) -> str:
-        """清理文件名，移除不合法字符"""
-        invalid_chars = ['/', '\\', ':', '*', '?', '"', '<', '>', '|']
-        for char in invalid_chars:
-            filename = filename.replace(char, '_')
-        return filename
+        """清理文件名，移除不合法字符
+
+        同一個標題會用於影片、字幕與材料的文件名，因此快取結果
+        """
+        return FileUtils._INVALID_CHARS_PATTERN.sub('_', filename)
+    
+    @staticmethod
+    def dump_json(data, path: Path, compress: bool = False):
+        """將資料寫入 JSON 文件，有安裝 orjson 時使用 orjson 編碼
+
+        先寫入暫存檔再以 os.replace 取代，中途中斷也不會留下寫到一半的文件。
+        compress 為 True 時以 gzip（壓縮等級 3）壓縮內容
+        """
+        if orjson is not None:
+            content = orjson.dumps(data, option=orjson.OPT_INDENT_2)
+        else:
+            content = json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+        if compress:
+            content = gzip.compress(content, compresslevel=3)
+        
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    
+    @staticmethod
+    def load_json(path: Path):
+        """讀取 JSON 文件，有安裝 orjson 時使用 orjson 解析；gzip 壓縮的文件會自動解壓"""
+        with open(path, 'rb') as f:
+            content = f.read()
+        if content[:2] == GZIP_MAGIC:
+            content = gzip.decompress(content)
+        return _loads_json(content)
 
 class CourseInfoDisplay:
     """課程資訊顯示器，負責格式化和顯示課程資訊"""
@@ -508,33 +874,34 @@ class CourseInfoDisplay:
         Args:
             course_data: 課程資料字典
         """
+        # 只用於輸出日誌，INFO 未啟用時不必走訪課程資料
+        if not logger.isEnabledFor(logging.INFO):
+            return
+        
         course_name = course_data.get('course_name', '未知課程')
         chapters = course_data.get('chapters', [])
         
         # 顯示基本資訊
         logger.info("\n=== 課程資訊 ===")
-        logger.info(f"課程名稱: {course_name}")
-        logger.info(f"章節數量: {len(chapters)}")
+        logger.info("課程名稱: %s", course_name)
+        logger.info("章節數量: %d", len(chapters))
         
-        # 計算總影片數
-        total_videos = sum(len(chapter.get('sub_chapters', [])) for chapter in chapters)
-        logger.info(f"影片總數: {total_videos}")
-        
-        # 計算成功和失敗的資源數
-        success_count = 0
+        # 一次走訪計算總影片數與失敗的資源數
+        total_videos = 0
         failed_count = 0
         for chapter in chapters:
             for sub_chapter in chapter.get('sub_chapters', []):
+                total_videos += 1
                 if 'error' in sub_chapter:
                     failed_count += 1
-                else:
-                    success_count += 1
+        success_count = total_videos - failed_count
+        logger.info("影片總數: %d", total_videos)
         
-        if success_count + failed_count > 0:
+        if total_videos > 0:
             logger.info("\n=== 影片資源資訊 ===")
-            logger.info(f"總資源數: {success_count + failed_count}")
-            logger.info(f"成功獲取: {success_count}")
-            logger.info(f"失敗數量: {failed_count}")
+            logger.info("總資源數: %d", total_videos)
+            logger.info("成功獲取: %d", success_count)
+            logger.info("失敗數量: %d", failed_count)
         
         logger.info("=" * 30)
 
@@ -543,30 +910,30 @@ def downloader():
     try:
         # 載入配置
         config = Config.from_yaml('config.yaml')
-        logger.info(f"已載入配置，課程編號: {config.course_num}")
+        logger.info("已載入配置，課程編號: %s", config.course_num)
         
-        # 初始化客戶端和下載器
-        client = SATCourseClient(config)
-        collector = CourseDataCollector(config, client)
-        downloader = CourseContentDownloader(config)
-        
-        # 處理課程內容
-        course_data = collector.process_course_content()
-        
-        # 顯示課程資訊
-        CourseInfoDisplay.display_course_info(course_data)
-        
-        # 根據配置決定是否下載
-        if config.download_from_fetch_dict or config.download_from_existed_json:
-            logger.info("開始下載課程內容...")
-            downloader.download(course_data)
-        else:
-            logger.info("根據配置，不下載課程內容")
+        # 初始化客戶端和下載器，結束時自動關閉各自的連線池
+        with SATCourseClient(config) as client, CourseContentDownloader(config) as downloader:
+            collector = CourseDataCollector(config, client)
+            
+            # 處理課程內容
+            course_data = collector.process_course_content()
+            course_name = CourseParser.extract_course_name(course_data)
+            
+            # 顯示課程資訊
+            CourseInfoDisplay.display_course_info(course_data)
+            
+            # 根據配置決定是否下載
+            if config.download_from_fetch_dict or config.download_from_existed_json:
+                logger.info("開始下載課程內容...")
+                downloader.download(course_data, course_name)
+            else:
+                logger.info("根據配置，不下載課程內容")
         
         logger.info("處理完成")
         
     except Exception as e:
-        logger.error(f"發生錯誤: {str(e)}")
+        logger.error("發生錯誤: %s", e)
         import traceback
         logger.error(traceback.format_exc())
 
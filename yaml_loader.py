@@ -0,0 +1,13 @@
+from functools import lru_cache
+
+import yaml
+
+# 有 libyaml 時使用 C 實作的解析器，否則退回純 Python 的 SafeLoader
+_Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+
+@lru_cache(maxsize=None)
+def load_yaml(config_file="config.yaml"):
+    """讀取並解析 YAML 配置，同一路徑在整個行程中只解析一次"""
+    with open(config_file, encoding="utf-8") as f:
+        return yaml.load(f, Loader=_Loader)